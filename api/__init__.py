@@ -1,4 +1,4 @@
-from api import caching, polygon, alpha_vantage
+from api import caching, polygon, alpha_vantage, portfolio
 import pandas as pd
 
 def tickers() -> dict:
@@ -71,6 +71,36 @@ def save_watchlist(watchlist: dict):
 
     caching.cache('watchlist', watchlist, False)
 
+def get_watchlist_matrix() -> tuple:
+    """Returns the watchlist's histories aligned into a (tickers, days, prices) matrix.
+    Each ticker's cached history is only read again when it has been rewritten, and then only its new bars are added to the matrix.
+    """
+
+    watchlist = get_watchlist()
+
+    for ticker in watchlist:
+        history_modified = caching.modified(f'historical.{ticker}')
+        splits_modified = caching.modified(f'splits.{ticker}')
+        if history_modified is not None and splits_modified is not None and portfolio.is_current(ticker, history_modified, splits_modified):
+            continue
+
+        # read the raw (unadjusted) history; the portfolio module applies the splits itself.
+        # write times are taken before reading, so a write in between is picked up on the next call
+        splits = get_splits(ticker)
+        history = caching.get(f'historical.{ticker}', alpha_vantage.get_full_ticker_history, False, ticker=ticker)
+        portfolio.update_series(
+            ticker, history, splits,
+            history_modified if history_modified is not None else caching.modified(f'historical.{ticker}'),
+            splits_modified if splits_modified is not None else caching.modified(f'splits.{ticker}')
+        )
+
+    return portfolio.update_matrix(tuple(watchlist))
+
+def get_portfolio_analytics(window: int = 63) -> dict:
+    """Returns volatility, drawdown and trailing-window correlation for every ticker in the watchlist, along with an equal-weighted portfolio."""
+
+    return portfolio.analyze(*get_watchlist_matrix(), window=window)
+
 def get_splits(ticker: str) -> dict:
     """Get all splits for a specified ticker."""
 
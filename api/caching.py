@@ -1,5 +1,51 @@
 from datetime import datetime, timedelta
-import json, os
+from os import getenv
+import gzip, hashlib, io, json, os, re, tarfile, tempfile, threading, time
+
+CACHE_DIR = 'api/cache/'
+
+# entries are stored gzip compressed; plain .json entries from older versions are still read and replaced on write
+EXTENSION = '.json.gz'
+LEGACY_EXTENSION = '.json'
+
+# disk budget for the cache in bytes (compressed size on disk); defaults to 500MB
+CACHE_MAX_BYTES = int(getenv('CACHE_MAX_BYTES', 500 * 1024 * 1024))
+
+# seconds between background sweeps of expired entries
+CACHE_SWEEP_INTERVAL = int(getenv('CACHE_SWEEP_INTERVAL', 60 * 60))
+
+# entries are written to temporary files first; ones older than this were left behind by a failed write
+TEMP_EXTENSION = '.tmp'
+TEMP_MAX_AGE = 10 * 60
+
+# permissions for entries, as open() would create them; the umask can only be read by setting it, so it's read once on import
+_umask = os.umask(0)
+os.umask(_umask)
+ENTRY_MODE = 0o666 & ~_umask
+
+# relative cost to refetch each key family, used to weigh eviction; families set to None are never evicted.
+# Alpha Vantage histories and news spend the 25 per day budget, the ticker list takes minutes of rate limited Polygon calls,
+# while splits and intraday windows are a single Polygon call.
+FAMILY_COST = {
+    'watchlist': None,
+    'historical': 100,
+    'tickers': 50,
+    'news': 25,
+    'splits': 2,
+    'intraday': 1,
+}
+
+# expiration is always the first key written, so it can be read without decompressing the whole entry
+EXPIRES_HEADER = re.compile(rb'^\{"expires": ([^,]+),')
+
+# bumped whenever the snapshot archive layout changes
+SNAPSHOT_VERSION = 2
+
+# user state that is never copied between installs by a snapshot
+SNAPSHOT_EXCLUDE = ('watchlist',)
+
+# key families whose data is a time series keyed by timestamp, so snapshot imports merge them bar by bar
+TIME_SERIES_FAMILIES = ('historical', 'intraday')
 
 class CacheNotFound(Exception):
     """This exception is thrown when a file does not exist in cache."""
@@ -13,6 +59,12 @@ class StaleCache(Exception):
     def __init__(self, file):
         super().__init__(f"StaleCache Warning: Loaded {file}.json from cache but it is stale.")
 
+class SnapshotCorrupt(Exception):
+    """This exception is thrown when a snapshot archive is unreadable or an entry fails its checksum."""
+
+    def __init__(self, snapshot, reason):
+        super().__init__(f"SnapshotCorrupt Error: {snapshot} could not be imported ({reason}).")
+
 def get(file_name: str, callback = None, callback_expiration: datetime = None, *callback_args, **callback_kwargs) -> dict:
     """Retrieves data from cache at the specified file name; if the data doesn't exist or has expired, it will execute the passed callback method.
     If callback is undefined, it will try to retrieve data via the callback, cache that, and return it.
@@ -20,9 +72,7 @@ def get(file_name: str, callback = None, callback_expiration: datetime = None, *
 
     # try to read file that exists, if it doesn't exist, run the callback with the arguments
     try:
-        file_path = 'api/cache/' + file_name + '.json'
-        with open(file_path, 'r') as f:
-            data = json.load(f)
+        data = read(file_name)
     except:
         # if callback is defined, execute and cache it
         if callback:
@@ -39,7 +89,12 @@ def get(file_name: str, callback = None, callback_expiration: datetime = None, *
 
         # if the cache is expired
         if expires < datetime.now().timestamp():
-            invalidate(file_name)
+
+            # the sweeper may have already removed it
+            try:
+                invalidate(file_name)
+            except FileNotFoundError:
+                pass
 
             # if callback is defined, executee and cache it
             if callback:
@@ -50,27 +105,108 @@ def get(file_name: str, callback = None, callback_expiration: datetime = None, *
             # callback not defined, raise StaleCache
             raise StaleCache(file_name)
 
+    # record the access for eviction; this must never cause a refetch (ie. an entry owned by another user can't be touched)
+    try:
+        touch(file_name)
+    except OSError:
+        pass
+
     # return data property since cache is structured as {expires: 0, data: {}}
     return data['data']
 
 def cache(file_name: str, data: dict, expires: datetime | bool = None):
-    """Cache data as a json file"""
+    """Cache data as a gzip compressed json file"""
 
     # if no expiration set, default expire at midnight
     if expires is None:
         now = datetime.now()
         expires = (datetime(now.year, now.month, now.day) + timedelta(days=1, hours=0)).timestamp()
 
-    file_path = 'api/cache/' + file_name + '.json'
+    file_path = CACHE_DIR + file_name + EXTENSION
+
+    # write to a unique temporary file and swap it in, so concurrent writers, the sweeper and readers never see a partial entry
+    fd, temp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=file_name + '.', suffix=TEMP_EXTENSION)
+    try:
+        with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt') as f:
+            json.dump({'expires': expires, 'data': data}, f)
+
+        # mkstemp creates files readable only by their owner, so give entries the usual permissions
+        os.chmod(temp_path, ENTRY_MODE)
+        os.replace(temp_path, file_path)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # remove the uncompressed entry if this replaced one
+    try:
+        os.remove(CACHE_DIR + file_name + LEGACY_EXTENSION)
+    except FileNotFoundError:
+        pass
+
+def _path(file_name: str) -> str:
+    """Returns the path of a cached entry, falling back to an uncompressed entry from older versions."""
+
+    file_path = CACHE_DIR + file_name + EXTENSION
+    if not os.path.exists(file_path) and os.path.exists(CACHE_DIR + file_name + LEGACY_EXTENSION):
+        return CACHE_DIR + file_name + LEGACY_EXTENSION
+
+    return file_path
+
+def read(file_name: str) -> dict:
+    """Reads the raw cache entry ({expires: 0, data: {}}) without checking expiration."""
+
+    file_path = _path(file_name)
+    with (gzip.open(file_path, 'rt') if file_path.endswith(EXTENSION) else open(file_path, 'r')) as f:
+        return json.load(f)
+
+def read_expires(file_name: str):
+    """Reads only the expiration of a cache entry, decompressing just the start of the file when possible."""
+
+    file_path = _path(file_name)
+    with (gzip.open(file_path, 'rb') if file_path.endswith(EXTENSION) else open(file_path, 'rb')) as f:
+        match = EXPIRES_HEADER.match(f.read(64))
+
+    # fall back to reading the whole entry
+    if not match:
+        return read(file_name).get('expires')
 
-    # save the cached data to the file
-    with open(file_path, 'w+') as f:
-        json.dump({'expires': expires, 'data': data}, f)
+    return json.loads(match.group(1))
+
+def touch(file_name: str):
+    """Records an access to a cache entry by setting its access time, which eviction uses to find the least recently used entries."""
+
+    # keep the modification time to the nanosecond, so modified() only changes when the entry is rewritten
+    file_path = _path(file_name)
+    os.utime(file_path, ns=(time.time_ns(), os.stat(file_path).st_mtime_ns))
+
+def modified(file_name: str) -> int:
+    """Returns when a cache entry was last written (in nanoseconds), or None if it isn't cached."""
+
+    try:
+        return os.stat(_path(file_name)).st_mtime_ns
+    except OSError:
+        return None
+
+def entries() -> list:
+    """Returns the names of all entries in the cache."""
+
+    if not os.path.isdir(CACHE_DIR):
+        return []
+
+    names = set()
+    for f in os.listdir(CACHE_DIR):
+        if f.endswith(EXTENSION):
+            names.add(f[:-len(EXTENSION)])
+        elif f.endswith(LEGACY_EXTENSION):
+            names.add(f[:-len(LEGACY_EXTENSION)])
+
+    return sorted(names)
 
 def invalidate(file_name):
     """Invalidates (deletes) a cached file"""
 
-    os.remove('api/cache/' + file_name + '.json')
+    os.remove(_path(file_name))
 
 def update(file_name: str, data: dict, callback=None, callback_expiration=None, *callback_args, **callback_kwargs):
     """Updates the cache without overwriting/appends data"""
@@ -80,4 +216,289 @@ def update(file_name: str, data: dict, callback=None, callback_expiration=None,
     
     # update cached_data with data and recache
     cached_data.update(data)
-    cache(file_name, cached_data, callback_expiration)
\ No newline at end of file
+    cache(file_name, cached_data, callback_expiration)
+
+def _expiry_rank(expires) -> float:
+    """Ranks an expiration for comparison; entries that never expire (False) rank highest."""
+
+    return float(expires) if expires else float('inf')
+
+def _remove_unchanged(file_path: str, stat: os.stat_result) -> bool:
+    """Removes a cache file only if it hasn't been rewritten since it was stat'ed, so a fresh entry written in the meantime survives."""
+
+    current = os.stat(file_path)
+    if (current.st_ino, current.st_mtime_ns) != (stat.st_ino, stat.st_mtime_ns):
+        return False
+
+    os.remove(file_path)
+    return True
+
+def _temp_files() -> list:
+    """Returns the paths of all temporary files in the cache."""
+
+    if not os.path.isdir(CACHE_DIR):
+        return []
+
+    return [CACHE_DIR + f for f in os.listdir(CACHE_DIR) if f.endswith(TEMP_EXTENSION)]
+
+def sweep() -> int:
+    """Deletes every expired entry, and temporary files left by failed writes, without waiting for them to be read; returns the number of entries removed."""
+
+    removed = 0
+    now = datetime.now().timestamp()
+
+    for file_name in entries():
+        try:
+            file_path = _path(file_name)
+            stat = os.stat(file_path)
+            if _expiry_rank(read_expires(file_name)) < now and _remove_unchanged(file_path, stat):
+                removed += 1
+        except (OSError, ValueError):
+            # the entry was replaced or removed while sweeping
+            continue
+
+    for temp_path in _temp_files():
+        try:
+            if now - os.stat(temp_path).st_mtime > TEMP_MAX_AGE:
+                os.remove(temp_path)
+        except OSError:
+            continue
+
+    return removed
+
+def enforce_budget(max_bytes: int = None) -> list:
+    """Evicts entries until the cache fits in its disk budget; returns the names of the evicted entries.
+    Entries are evicted by their idle time (since last access) times their size, divided by the cost to refetch their key family,
+    so large, stale and cheap entries (ie. intraday windows) go before expensive Alpha Vantage histories.
+    """
+
+    if max_bytes is None:
+        max_bytes = CACHE_MAX_BYTES
+
+    now = datetime.now().timestamp()
+    candidates = []
+    total = 0
+
+    # temporary files take up disk too
+    for temp_path in _temp_files():
+        try:
+            total += os.stat(temp_path).st_size
+        except OSError:
+            continue
+
+    for file_name in entries():
+        try:
+            file_path = _path(file_name)
+            stat = os.stat(file_path)
+        except OSError:
+            continue
+
+        total += stat.st_size
+
+        # never evict families that can't be refetched
+        cost = FAMILY_COST.get(file_name.split('.')[0], 1)
+        if cost is None:
+            continue
+
+        idle = max(now - stat.st_atime, 1)
+        candidates.append((idle * stat.st_size / cost, file_name, file_path, stat))
+
+    evicted = []
+    if total <= max_bytes:
+        return evicted
+
+    # evict the highest scores first
+    for _, file_name, file_path, stat in sorted(candidates, key=lambda candidate: candidate[0], reverse=True):
+        if total <= max_bytes:
+            break
+
+        try:
+            if _remove_unchanged(file_path, stat):
+                total -= stat.st_size
+                evicted.append(file_name)
+        except OSError:
+            continue
+
+    return evicted
+
+def start_sweeper(interval: int = None) -> threading.Thread:
+    """Starts a background thread that periodically sweeps expired entries and enforces the disk budget."""
+
+    if interval is None:
+        interval = CACHE_SWEEP_INTERVAL
+
+    def run():
+        while True:
+            try:
+                sweep()
+                enforce_budget()
+            except Exception as e:
+                print(f"Cache sweep failed: {e}")
+
+            time.sleep(interval)
+
+    # daemon thread so it never keeps the server from shutting down
+    thread = threading.Thread(target=run, name='cache-sweeper', daemon=True)
+    thread.start()
+
+    return thread
+
+def _is_expired(entry: dict) -> bool:
+    """Checks whether a raw cache entry has expired."""
+
+    return _expiry_rank(entry.get('expires')) < datetime.now().timestamp()
+
+def merge(file_name: str, existing: dict, incoming: dict) -> dict:
+    """Merges two raw cache entries, keeping the later expiration.
+    Time series (historical and intraday entries) are merged by timestamp, with values from the fresher entry winning;
+    any other entry is replaced by the fresher one. On a tie the existing entry wins.
+    """
+
+    newer, older = (incoming, existing) if _expiry_rank(incoming.get('expires')) > _expiry_rank(existing.get('expires')) else (existing, incoming)
+
+    if file_name.split('.')[0] in TIME_SERIES_FAMILIES and isinstance(newer.get('data'), dict) and isinstance(older.get('data'), dict):
+        # keep the series in timestamp order, since callers take the last key as the latest bar
+        data = dict(sorted({**older['data'], **newer['data']}.items(), key=lambda item: int(item[0])))
+    else:
+        data = newer.get('data')
+
+    return {'expires': newer.get('expires'), 'data': data}
+
+def _timezone() -> dict:
+    """Returns the local timezone's name and standard UTC offset in seconds."""
+
+    return {'name': time.tzname[0], 'utc_offset': -time.timezone}
+
+def _rekey_daily_bars(history: dict, utc_offset: int) -> dict:
+    """Re-keys Alpha Vantage daily bars from another timezone's local midnight to this one's.
+    Daily bars (float volume) are stored at the exporter's local midnight, so rounding with its standard offset recovers the date
+    even across daylight saving; intraday bars are UTC and keep their keys.
+    """
+
+    rekeyed = {}
+
+    for timestamp, bar in history.items():
+        if isinstance(bar, dict) and isinstance(bar.get('volume'), float):
+            day = (int(timestamp) + utc_offset + 12 * 60 * 60) // (24 * 60 * 60)
+            timestamp = str(int((datetime(1970, 1, 1) + timedelta(days=day)).timestamp()))
+
+        rekeyed[timestamp] = bar
+
+    return dict(sorted(rekeyed.items(), key=lambda item: int(item[0])))
+
+def _add_to_archive(tar: tarfile.TarFile, name: str, payload: bytes):
+    """Adds an in-memory file to a tar archive."""
+
+    info = tarfile.TarInfo(name)
+    info.size = len(payload)
+    info.mtime = int(datetime.now().timestamp())
+    tar.addfile(info, io.BytesIO(payload))
+
+def export_snapshot(snapshot_path: str) -> int:
+    """Exports every unexpired cache entry (except the watchlist) into a single gzip compressed snapshot archive.
+    The archive holds one member per entry along with a manifest.json of their sha256 checksums; returns the number of entries exported.
+    Entries that can't be read are skipped.
+    """
+
+    manifest = {}
+
+    # write to a temporary file first so a failed export never leaves a partial snapshot behind
+    temp_path = snapshot_path + '.tmp'
+    try:
+        with tarfile.open(temp_path, 'w:gz') as tar:
+            for file_name in entries():
+                if file_name.split('.')[0] in SNAPSHOT_EXCLUDE:
+                    continue
+
+                try:
+                    entry = read(file_name)
+                except (OSError, ValueError) as e:
+                    print(f"Skipping unreadable cache entry {file_name}: {e}")
+                    continue
+
+                if _is_expired(entry):
+                    continue
+
+                payload = json.dumps(entry).encode()
+                manifest[file_name] = {'sha256': hashlib.sha256(payload).hexdigest(), 'expires': entry.get('expires')}
+                _add_to_archive(tar, file_name + '.json', payload)
+
+            _add_to_archive(tar, 'manifest.json', json.dumps({
+                'version': SNAPSHOT_VERSION,
+                'created': datetime.now().timestamp(),
+                # daily history bars are keyed by local midnight, so importers in another timezone re-key them
+                'timezone': _timezone(),
+                'entries': manifest
+            }).encode())
+
+        os.replace(temp_path, snapshot_path)
+    except:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return len(manifest)
+
+def import_snapshot(snapshot_path: str) -> int:
+    """Imports a snapshot archive into the cache, merging each entry with any existing cached entry.
+    Daily history bars from a snapshot exported in another timezone are re-keyed to this timezone's local midnight.
+    Every checksum is verified before anything is written, so a corrupt snapshot leaves the cache untouched;
+    returns the number of entries imported that are still cached after the disk budget is enforced.
+    """
+
+    snapshot = {}
+
+    # read and verify the whole archive before touching the cache
+    try:
+        with tarfile.open(snapshot_path, 'r:gz') as tar:
+            manifest = json.load(tar.extractfile('manifest.json'))
+            if manifest.get('version') != SNAPSHOT_VERSION:
+                raise SnapshotCorrupt(snapshot_path, f"unsupported version {manifest.get('version')}")
+
+            for file_name, info in manifest.get('entries').items():
+
+                # entry names become cache file names, so never allow paths
+                if os.path.basename(file_name) != file_name or file_name.startswith('.'):
+                    raise SnapshotCorrupt(snapshot_path, f"invalid entry name {file_name}")
+
+                payload = tar.extractfile(file_name + '.json').read()
+                if hashlib.sha256(payload).hexdigest() != info.get('sha256'):
+                    raise SnapshotCorrupt(snapshot_path, f"checksum mismatch on {file_name}")
+
+                snapshot[file_name] = json.loads(payload)
+
+            # re-key daily history bars if the snapshot was exported in another timezone
+            exported_timezone = manifest.get('timezone')
+            if exported_timezone != _timezone():
+                for file_name, entry in snapshot.items():
+                    if file_name.split('.')[0] == 'historical' and isinstance(entry.get('data'), dict):
+                        entry['data'] = _rekey_daily_bars(entry['data'], exported_timezone.get('utc_offset'))
+    except SnapshotCorrupt:
+        raise
+    except Exception as e:
+        raise SnapshotCorrupt(snapshot_path, e)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    imported = set()
+
+    for file_name, entry in snapshot.items():
+
+        # never overwrite local user state
+        if _is_expired(entry) or file_name.split('.')[0] in SNAPSHOT_EXCLUDE:
+            continue
+
+        # merge with the existing entry if there is an unexpired one
+        try:
+            existing = read(file_name)
+            if not _is_expired(existing):
+                entry = merge(file_name, existing, entry)
+        except (OSError, ValueError):
+            pass
+
+        cache(file_name, entry.get('data'), entry.get('expires'))
+        imported.add(file_name)
+
+    # check the disk budget once all entries are written, rather than after every write
+    imported.difference_update(enforce_budget())
+
+    return len(imported)
@@ -0,0 +1,383 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+import numpy as np
+import threading
+import time
+import warnings
+
+# trading days per year, used to annualize volatility
+TRADING_DAYS = 252
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_HOUR = 3600
+
+# Polygon intraday bars are grouped into the trading day they belong to in market time,
+# and only bars starting in the regular session (09:30 to 16:00) are used, so their last close matches the daily close
+MARKET_TIMEZONE = ZoneInfo('America/New_York')
+MARKET_OPEN = 9 * SECONDS_PER_HOUR + 30 * 60
+MARKET_CLOSE = 16 * SECONDS_PER_HOUR
+
+# how far before the last seen bar an incremental update rereads, so the days it touches are recomputed from all their bars
+INCREMENTAL_LOOKBACK = 7 * SECONDS_PER_DAY
+
+# number of series revisions remembered, so the matrix can be extended from the earliest changed day
+REVISION_LOG = 16
+
+# guards the per-ticker series and the matrix, which are shared by Dash's threaded request handlers
+_lock = threading.Lock()
+
+# UTC offsets (local, market) in seconds for each UTC hour; offsets only change on the hour, and every ticker shares the same hours
+_offsets = {}
+
+# per-ticker split adjusted daily closes, along with the watermarks they were built from:
+# {ticker: {days, closes, watermark, history_modified, splits_modified, splits, revision, changes}}
+_series = {}
+
+# aligned date x ticker closing price matrix, kept in memory and extended as new bars are cached
+_matrix = {
+    'tickers': (),
+    'revisions': {},
+    'days': np.empty(0, dtype='int64'),
+    'prices': np.empty((0, 0)),
+}
+
+def _calendar_days(timestamps: np.ndarray, daily: np.ndarray) -> tuple:
+    """Converts timestamps to integer calendar days since the epoch; returns (days, regular), where regular marks the bars to use.
+    Alpha Vantage daily bars are stored at local midnight, so they keep their local date; Polygon intraday bars are UTC,
+    so they take their date in market time and are only regular if they start within the regular session.
+    """
+
+    hours, inverse = np.unique(timestamps // SECONDS_PER_HOUR, return_inverse=True)
+
+    # look up the offsets once per distinct hour
+    for hour in hours.tolist():
+        if hour not in _offsets:
+            _offsets[hour] = (
+                time.localtime(hour * SECONDS_PER_HOUR).tm_gmtoff,
+                int(datetime.fromtimestamp(hour * SECONDS_PER_HOUR, MARKET_TIMEZONE).utcoffset().total_seconds())
+            )
+
+    offsets = np.array([_offsets[hour] for hour in hours.tolist()], dtype='int64').reshape(-1, 2)[inverse.reshape(-1)]
+    local = timestamps + offsets[:, 0]
+    market = timestamps + offsets[:, 1]
+
+    days = np.where(daily, local // SECONDS_PER_DAY, market // SECONDS_PER_DAY)
+    session = market % SECONDS_PER_DAY
+    regular = daily | ((session >= MARKET_OPEN) & (session < MARKET_CLOSE))
+
+    return days, regular
+
+def _daily_closes(timestamps: np.ndarray, closes: np.ndarray, daily: np.ndarray, splits: list) -> tuple:
+    """Converts bars into (days, closes) arrays with strictly increasing days, adjusted for splits.
+    Each day takes its Alpha Vantage daily close if there is one, otherwise the last regular session intraday close.
+    """
+
+    closes = closes.copy()
+
+    # apply each split ratio to the bars before it, the same way api.get_ticker_history does
+    for split in splits:
+        date = int(np.datetime64(split.get('date'), 's').astype('int64'))
+        ratio = split.get('split_from') / split.get('split_to')
+        before = timestamps < date
+        closes[before] = np.round(closes[before] * ratio, 2)
+
+    days, regular = _calendar_days(timestamps, daily)
+    timestamps, closes, daily, days = timestamps[regular], closes[regular], daily[regular], days[regular]
+
+    # sort by day, then intraday bars by time with any daily bar last, and keep the last bar of each day
+    order = np.lexsort((timestamps, daily, days))
+    days = days[order]
+    closes = closes[order]
+    last = np.append(days[1:] != days[:-1], True)
+
+    return days[last], closes[last]
+
+def _bars(history: dict, after: int = None) -> tuple:
+    """Returns (timestamps, closes, daily) arrays for the bars in a history dict, optionally only those newer than a timestamp.
+    Alpha Vantage stores volume as a float and Polygon as an int, which tells daily bars apart from intraday bars that land on the same time.
+    """
+
+    timestamps = np.fromiter((int(t) for t in history), dtype='int64', count=len(history))
+
+    if after is None:
+        keys = list(history)
+    else:
+        newer = timestamps > after
+        keys = [key for key, keep in zip(history, newer) if keep]
+        timestamps = timestamps[newer]
+
+    closes = np.fromiter((float(history[key].get('close')) for key in keys), dtype=float, count=len(keys))
+    daily = np.fromiter((isinstance(history[key].get('volume'), float) for key in keys), dtype=bool, count=len(keys))
+
+    return timestamps, closes, daily
+
+def is_current(ticker: str, history_modified: float, splits_modified: float) -> bool:
+    """Checks whether a ticker's series was built from the currently cached history and splits."""
+
+    with _lock:
+        state = _series.get(ticker)
+
+    return state is not None and state['history_modified'] == history_modified and state['splits_modified'] == splits_modified
+
+def _build_series(ticker: str, history: dict, splits: list, history_modified: float, splits_modified: float):
+    """Recomputes a ticker's whole series from its raw cached history; the caller holds the lock."""
+
+    state = _series.get(ticker)
+    timestamps, closes, daily = _bars(history)
+    days, closes = _daily_closes(timestamps, closes, daily, splits)
+    revision = state['revision'] + 1 if state else 0
+
+    _series[ticker] = {
+        'days': days,
+        'closes': closes,
+        'watermark': int(timestamps.max()) if len(timestamps) else 0,
+        'history_modified': history_modified,
+        'splits_modified': splits_modified,
+        'splits': splits,
+        'revision': revision,
+        # None marks a change the matrix can't extend from
+        'changes': [(revision, None)],
+    }
+
+def update_series(ticker: str, history: dict, splits: list, history_modified: float, splits_modified: float):
+    """Updates a ticker's daily closes from its raw cached history.
+    If the splits are unchanged, only the days touched by bars newer than the last seen timestamp are recomputed;
+    otherwise the whole series is recomputed.
+    """
+
+    with _lock:
+        state = _series.get(ticker)
+
+        # full recompute for a new ticker or when the split adjustments changed
+        if state is None or state['splits'] != splits:
+            _build_series(ticker, history, splits, history_modified, splits_modified)
+            return
+
+        state.update(history_modified=history_modified, splits_modified=splits_modified)
+
+        # reread a lookback before the watermark, so every day the new bars touch is recomputed from all of its bars
+        watermark = state['watermark']
+        timestamps, closes, daily = _bars(history, after=watermark - INCREMENTAL_LOOKBACK)
+        newer = timestamps > watermark
+        if not newer.any():
+            return
+
+        new_days, new_closes = _daily_closes(timestamps, closes, daily, splits)
+
+        # the earliest days read may be cut off by the lookback, so only days from two days after it are replaced;
+        # if the new bars fall before that (ie. after a long gap in the history), recompute the whole series
+        start = int(new_days[0]) + 2 if len(new_days) else None
+        if start is None or start > _calendar_days(timestamps[newer], daily[newer])[0].min():
+            _build_series(ticker, history, splits, history_modified, splits_modified)
+            return
+
+        keep = state['days'] < start
+        replace = new_days >= start
+        state['revision'] += 1
+        state['changes'] = (state['changes'] + [(state['revision'], start)])[-REVISION_LOG:]
+        state.update(
+            days=np.concatenate([state['days'][keep], new_days[replace]]),
+            closes=np.concatenate([state['closes'][keep], new_closes[replace]]),
+            watermark=int(timestamps.max()),
+        )
+
+def _forward_fill(prices: np.ndarray) -> np.ndarray:
+    """Fills missing (NaN) prices with the last known price in the same column; leading NaNs stay NaN."""
+
+    rows = np.arange(prices.shape[0])[:, None]
+    index = np.where(np.isnan(prices), 0, rows)
+    np.maximum.accumulate(index, axis=0, out=index)
+
+    return prices[index, np.arange(prices.shape[1])]
+
+def _align(series: list) -> tuple:
+    """Aligns a list of (days, closes) pairs into a (days, prices) matrix with one column per series."""
+
+    if not series:
+        return np.empty(0, dtype='int64'), np.empty((0, 0))
+
+    days = np.unique(np.concatenate([d for d, _ in series]))
+    prices = np.full((len(days), len(series)), np.nan)
+
+    for column, (d, c) in enumerate(series):
+        prices[np.searchsorted(days, d), column] = c
+
+    return days, prices
+
+def _changed_from(tickers: tuple):
+    """Returns the earliest day changed in any series since the matrix was built; None if it must be rebuilt, or inf if nothing changed."""
+
+    start = float('inf')
+
+    for ticker in tickers:
+        state = _series[ticker]
+        built = _matrix['revisions'].get(ticker)
+        if built == state['revision']:
+            continue
+
+        changes = [day for revision, day in state['changes'] if revision > built]
+
+        # the log doesn't reach back to the matrix's revision, or a change can't be extended from
+        if len(changes) != state['revision'] - built or None in changes:
+            return None
+
+        start = min(start, min(changes))
+
+    return start
+
+def update_matrix(tickers: tuple) -> tuple:
+    """Returns the aligned (tickers, days, prices) matrix of the tickers' series.
+    Only rows from the earliest changed day onward are recomputed; the matrix is rebuilt when the tickers change or a series was recomputed.
+    """
+
+    with _lock:
+        tickers = tuple(tickers)
+        days, prices = _matrix['days'], _matrix['prices']
+        start = _changed_from(tickers) if tickers == _matrix['tickers'] and len(days) else None
+
+        if start == float('inf'):
+            return tickers, days, prices
+
+        # rebuild from scratch
+        if start is None or start <= days[0]:
+            days, prices = _align([(_series[t]['days'], _series[t]['closes']) for t in tickers])
+            prices = _forward_fill(prices)
+
+        # recompute the changed rows, forward filled from the last row that is kept
+        else:
+            kept = np.searchsorted(days, start)
+            new_days, new_prices = _align([(_series[t]['days'][_series[t]['days'] >= start], _series[t]['closes'][_series[t]['days'] >= start]) for t in tickers])
+            new_prices = _forward_fill(np.vstack([prices[kept - 1], new_prices]))[1:]
+
+            days = np.concatenate([days[:kept], new_days])
+            prices = np.vstack([prices[:kept], new_prices])
+
+        _matrix.update(
+            tickers=tickers,
+            revisions={t: _series[t]['revision'] for t in tickers},
+            days=days,
+            prices=prices,
+        )
+
+        return tickers, days, prices
+
+def returns(prices: np.ndarray) -> np.ndarray:
+    """Returns simple daily returns for each column of the price matrix; NaN where a price is missing."""
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return prices[1:] / prices[:-1] - 1
+
+def volatility(daily_returns: np.ndarray) -> np.ndarray:
+    """Returns the annualized volatility of each column of the returns matrix."""
+
+    # columns with fewer than two returns are NaN, so silence numpy's degrees of freedom warning
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return np.nanstd(daily_returns, axis=0, ddof=1) * np.sqrt(TRADING_DAYS)
+
+def drawdown(prices: np.ndarray) -> np.ndarray:
+    """Returns the drawdown matrix; the fraction each price sits below its running peak (0 at a new high)."""
+
+    # NaN prices (before a ticker's first close) are treated as -inf so they don't set the peak
+    peaks = np.maximum.accumulate(np.nan_to_num(prices, nan=-np.inf), axis=0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return prices / peaks - 1
+
+def rolling_correlation(daily_returns: np.ndarray, window: int = 63, periods: int = 63) -> np.ndarray:
+    """Returns a (periods x ticker x ticker) series of correlation matrices, one for each of the last periods trailing windows of days.
+    Windowed sums come from cumulative sums of products, and each pair is normalized by its own count of overlapping days,
+    so tickers with gaps or later listings aren't pulled towards 0.
+    """
+
+    window = min(window, len(daily_returns))
+    periods = min(periods, len(daily_returns) - window + 1)
+    n_tickers = daily_returns.shape[1]
+
+    if window < 2 or periods < 1:
+        return np.full((0, n_tickers, n_tickers), np.nan)
+
+    r = daily_returns[-(window + periods - 1):]
+    valid = ~np.isnan(r)
+    x = np.where(valid, r, 0)
+    v = valid.astype(float)
+
+    def windowed(products):
+        """Sums the products over each trailing window."""
+
+        # cumulative sums with a leading row of zeros, so each window is a difference of two rows
+        sums = np.empty((len(products) + 1,) + products.shape[1:])
+        sums[0] = 0
+        np.cumsum(products, axis=0, out=sums[1:])
+        return sums[window:] - sums[:-window]
+
+    # products of returns, summed over each window; missing returns are 0 so they drop out of the sum
+    sum_xy = windowed(x[:, :, None] * x[:, None, :])
+
+    # with no gaps, every pair overlaps on the whole window, so the per-ticker sums can be broadcast
+    if valid.all():
+        count = window
+        sum_x = windowed(x)[:, :, None]
+        sum_xx = windowed(x * x)[:, :, None]
+
+    # otherwise each pair is summed over only the days both tickers have a return
+    else:
+        count = windowed(v[:, :, None] * v[:, None, :])
+        sum_x = windowed(x[:, :, None] * v[:, None, :])
+        sum_xx = windowed((x * x)[:, :, None] * v[:, None, :])
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # covariance is built in place in sum_xy to avoid more copies of the (periods x ticker x ticker) arrays
+        correlation = sum_xy
+        correlation -= sum_x * sum_x.swapaxes(1, 2) / count
+        deviation = sum_xx - sum_x ** 2 / count
+        correlation /= np.sqrt(deviation * deviation.swapaxes(1, 2))
+
+    # pairs with fewer than two overlapping days have no correlation
+    correlation[np.broadcast_to(count < 2, correlation.shape)] = np.nan
+
+    return np.clip(correlation, -1, 1, out=correlation)
+
+def correlation(daily_returns: np.ndarray, window: int = 63) -> np.ndarray:
+    """Returns the ticker x ticker correlation matrix of returns over the trailing window of days."""
+
+    rolling = rolling_correlation(daily_returns, window, periods=1)
+    if len(rolling) == 0:
+        return np.full((daily_returns.shape[1],) * 2, np.nan)
+
+    return rolling[-1]
+
+def analyze(tickers: tuple, days: np.ndarray, prices: np.ndarray, window: int = 63, periods: int = 63) -> dict:
+    """Runs portfolio analytics over the aligned price matrix; each ticker's statistics are computed in one vectorized pass,
+    along with an equal-weighted portfolio of the whole watchlist.
+    """
+
+    daily_returns = returns(prices)
+    drawdowns = drawdown(prices)
+    rolling = rolling_correlation(daily_returns, window, periods)
+
+    # equal-weighted portfolio, averaging over the tickers that have a return on each day
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        portfolio_returns = np.nanmean(daily_returns, axis=1) if len(tickers) else np.empty(0)
+    portfolio_value = np.cumprod(1 + np.nan_to_num(portfolio_returns))
+    portfolio_drawdown = drawdown(portfolio_value[:, None])[:, 0]
+
+    dates = (days * SECONDS_PER_DAY).astype('datetime64[s]')
+
+    return {
+        'tickers': list(tickers),
+        'dates': dates,
+        'volatility': volatility(daily_returns),
+        'max_drawdown': np.nanmin(drawdowns, axis=0, initial=0),
+        'drawdown': drawdowns[-1] if len(drawdowns) else np.empty(0),
+        'correlation': rolling[-1] if len(rolling) else np.full((len(tickers),) * 2, np.nan),
+        'rolling_correlation': rolling,
+        'rolling_dates': dates[len(dates) - len(rolling):],
+        'portfolio': {
+            'value': portfolio_value,
+            'volatility': float(volatility(portfolio_returns[:, None])[0]) if len(portfolio_returns) > 1 else float('nan'),
+            'max_drawdown': float(portfolio_drawdown.min(initial=0)),
+            'drawdown': float(portfolio_drawdown[-1]) if len(portfolio_drawdown) else 0.0,
+        },
+    }
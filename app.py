@@ -2,10 +2,15 @@ import dash
 from dash import Dash, html
 import dash_bootstrap_components as dbc
 
+from api import caching
+
 app = Dash(__name__, use_pages=True, external_stylesheets=[dbc.themes.BOOTSTRAP])
 
 server = app.server
 
+# remove expired cache entries and keep the cache within its disk budget in the background
+caching.start_sweeper()
+
 app.layout = html.Div([
     dash.page_container
 ], id="page_wrapper")
@@ -39,6 +39,7 @@ def layout():
         # watchlist / right side panel
         html.Div([
             html.H3("Ticker Watchlist"),
+            html.P(dcc.Link("Portfolio Analytics", href="/portfolio", target="_blank")),
             html.Div([dcc.Dropdown(id="ticker_search"), dbc.Button(
                 "Add", color="primary", id="add_ticker_btn")], id="options", className="controlBar"),
             dcc.Loading([
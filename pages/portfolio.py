@@ -0,0 +1,70 @@
+import plotly.express as px
+import plotly.graph_objects as go
+import numpy as np
+import warnings
+import dash
+from dash import html, dcc
+
+import api
+
+# register page with Dash
+dash.register_page(__name__, path='/portfolio')
+
+def percent(value) -> str:
+    """Formats a fraction as a percentage, or a dash if it's missing."""
+
+    return '-' if value != value else f"{value * 100:.2f}%"
+
+# HTML layout
+def layout(**kwargs):
+    analytics = api.get_portfolio_analytics()
+    tickers = analytics.get('tickers')
+    summary = analytics.get('portfolio')
+
+    # equal-weighted portfolio value over time
+    value_fig = go.Figure(data=[
+        go.Scatter(x=analytics.get('dates')[1:], y=summary.get('value'), line=dict(color='blue'), name="Portfolio Value")
+    ])
+    value_fig.update_layout(title="Equal-weighted Watchlist Growth of $1", xaxis_title="Date", yaxis_title="Value", hovermode='x unified')
+
+    # average correlation between each pair of tickers over each trailing window
+    rolling = analytics.get('rolling_correlation')
+    pairs = ~np.eye(len(tickers), dtype=bool)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        average_correlation = np.nanmean(rolling[:, pairs], axis=1) if len(tickers) > 1 else np.empty(0)
+    rolling_fig = go.Figure(data=[
+        go.Scatter(x=analytics.get('rolling_dates'), y=average_correlation, line=dict(color='grey'), name="Average Correlation")
+    ])
+    rolling_fig.update_layout(title="Rolling 3 month Average Pairwise Correlation", xaxis_title="Date", yaxis_title="Correlation", hovermode='x unified')
+
+    # correlation heatmap of the trailing window
+    correlation_fig = px.imshow(analytics.get('correlation'), x=tickers, y=tickers, zmin=-1, zmax=1,
+                                color_continuous_scale='RdBu', title="3 month Return Correlation")
+
+    return html.Div([
+        dcc.Location(id='url'),
+        html.P([dcc.Link("← Home Page", href="/")]),
+        dcc.Graph(figure=value_fig),
+        html.Table([
+            html.Tr([
+                html.Th("Portfolio Volatility"), html.Td(percent(summary.get('volatility'))),
+                html.Th("Max Drawdown"), html.Td(percent(summary.get('max_drawdown'))),
+                html.Th("Current Drawdown"), html.Td(percent(summary.get('drawdown')))
+            ])
+        ]),
+        html.Table([
+            html.Thead([html.Tr([html.Th("Ticker"), html.Th("Volatility"), html.Th("Max Drawdown"), html.Th("Current Drawdown")])]),
+            html.Tbody([
+                html.Tr([
+                    html.Td(dcc.Link(ticker, href=f'/news/{ticker}', target='_blank')),
+                    html.Td(percent(analytics.get('volatility')[i])),
+                    html.Td(percent(analytics.get('max_drawdown')[i])),
+                    html.Td(percent(analytics.get('drawdown')[i]))
+                ])
+                for i, ticker in enumerate(tickers)
+            ])
+        ]),
+        dcc.Graph(figure=rolling_fig),
+        dcc.Graph(figure=correlation_fig)
+    ], className="portfolio_page")
@@ -0,0 +1,21 @@
+import argparse
+
+from api import caching
+
+# Exports/imports the cache so a new instance can start warm without spending any API calls.
+# usage:
+#   python snapshot.py export cache.snapshot.tar.gz
+#   python snapshot.py import cache.snapshot.tar.gz
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export or import a SimpleStocks cache snapshot.")
+    parser.add_argument('action', choices=['export', 'import'], help="export the cache to a snapshot, or import a snapshot into the cache")
+    parser.add_argument('path', help="path of the snapshot archive")
+    args = parser.parse_args()
+
+    if args.action == 'export':
+        count = caching.export_snapshot(args.path)
+        print(f"Exported {count} cache entries to {args.path}.")
+    else:
+        count = caching.import_snapshot(args.path)
+        print(f"Imported {count} cache entries from {args.path}.")